@@ -1,37 +1,191 @@
+import asyncio
 import json
-from typing import Callable, Literal
+import logging
+from typing import Any, Callable, Literal
 
-from openai import AzureOpenAI
+from openai import AsyncAzureOpenAI
 from openai.types import FunctionDefinition
+from openai.types.chat import ChatCompletionMessage, ChatCompletionMessageToolCall
 from openai.types.chat.chat_completion import Choice
 
 from .config import CONFIG
-from .llm import get_llm
-from .tools import get_tool_list
+from .llm import get_async_llm
+from .llm_cache import create_chat_completion
+from .semantic_cache import SemanticCache
+from .tools import get_tool_list, get_tools_payload
+
+try:
+    import orjson
+except ImportError:  # fall back to the slower stdlib json
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+def _json_loads(data: str) -> Any:  # noqa: ANN401
+    """Parse JSON returned by the LLM."""
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def _json_dumps(data: Any) -> str:  # noqa: ANN401
+    """Serialize a tool result to a JSON string."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(data)
+
 
 SYSTEM_PROMPT = """You are an AI assistant, who is responsable for answering the user question.
 You can use the available tools to answer the question.
 If a file_url is provided, the file needs to be downloaded first and the the tools can access the file. (except tools which accept URLs as input).
-If you need to access a website, but the URL is not directly priovided, use the web_search tool first to find the URL."""
+If you need to access a website, but the URL is not directly priovided, use the web_search tool first to find the URL.
+
+When you are done, reply with the final answer only.
+Sometimes the question already has a formatting instruction, so you need to follow it.
+The Answer should be a number OR as few words as possible OR a comma separated list of numbers and/or strings.
+If you are asked for a number, don't use comma to write your number neither use units such as $ or percent sign
+unless specified otherwise.
+If you are asked for a string, don't use articles, neither abbreviations (e.g. for cities), and write the digits in
+plain text unless specified otherwise.
+If you are asked for a comma separated list, apply the above rules depending of whether the element to be put
+in the list is a number or a string."""
+
+# the final reply of the model is enforced to follow this schema, so no separate formatting call is needed
+FINAL_ANSWER_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "final_answer",
+        "schema": {
+            "type": "object",
+            "properties": {"answer": {"type": "string"}},
+            "required": ["answer"],
+            "additionalProperties": False,
+        },
+        "strict": True,
+    },
+}
+
+# tool results of earlier turns are cut to this length, once the history exceeds AGENT_MAX_HISTORY_CHARS
+TRUNCATED_TOOL_RESULT_CHARS = 500
+TRUNCATED_MARKER = " [truncated]"
+
+
+def _content_length(message: dict | ChatCompletionMessage) -> int:
+    """Return the length of the text content of a message."""
+    content = message.get("content") if isinstance(message, dict) else message.content
+    return len(content) if isinstance(content, str) else 0
 
 
 class Agent:
-    """GAIA Agent Class."""
+    """GAIA Agent Class.
+
+    An instance is used either through the sync API (`answer_question`, `answer_questions`) or the async API
+    (`answer_question_async`, `answer_questions_async`), never both: the connection pool of the async client is bound
+    to the event loop it is used on. Call `close` (or `close_async`) or use the agent as a context manager when done.
+    """
 
-    llm: AzureOpenAI
+    llm: AsyncAzureOpenAI
     tools: dict[str, tuple[Callable, FunctionDefinition]]
     tool_definitions: list[FunctionDefinition]
+    tool_definitions_payload: list[dict]
+    semantic_cache: SemanticCache | None = None
+    cache_enabled: bool = CONFIG.SEMANTIC_CACHE_ENABLED
     model_name: str = CONFIG.AGENT_MODEL_NAME
     reasoning_model_name: str = CONFIG.AGENT_REASONING_MODEL_NAME
     reasoning_effort: Literal["low", "medium", "high"] = "low"
 
     def __init__(self):
-        self.llm = get_llm()
+        self.llm = get_async_llm()
         self.tools = get_tool_list()
         self.tool_definitions = [tool[1] for tool in self.tools.values()]
+        # the tools payload doesn't change between LLM calls, so it is only serialized once
+        self.tool_definitions_payload = get_tools_payload()
+        # event loop for the sync API, the async client has to be used on the same loop for every call
+        self._runner = asyncio.Runner()
+        self._closed = False
+
+    def __enter__(self) -> "Agent":
+        """Use the agent with the sync API and close it on exit."""
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Close the agent."""
+        self.close()
+
+    async def __aenter__(self) -> "Agent":
+        """Use the agent with the async API and close it on exit."""
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        """Close the agent."""
+        await self.close_async()
+
+    def close(self) -> None:
+        """Close the LLM client and the event loop of the sync API, including the worker threads of the tools."""
+        if self._closed:
+            return
+        self._closed = True
+        with self._runner:
+            self._runner.run(self.llm.close())
+
+    async def close_async(self) -> None:
+        """Close the LLM client of an agent used through the async API."""
+        if self._closed:
+            return
+        self._closed = True
+        await self.llm.close()
 
     def answer_question(self, question: str) -> str:
         """Answer a question using the LLM and the available tools."""
+        return self._runner.run(self.answer_question_async(question))
+
+    def answer_questions(self, questions: list[str], max_concurrency: int = CONFIG.AGENT_MAX_CONCURRENCY) -> list[str]:
+        """Answer multiple questions concurrently and return the answers in the order of the questions."""
+        return self._runner.run(self.answer_questions_async(questions, max_concurrency=max_concurrency))
+
+    async def answer_questions_async(
+        self,
+        questions: list[str],
+        max_concurrency: int = CONFIG.AGENT_MAX_CONCURRENCY,
+    ) -> list[str]:
+        """Answer multiple questions concurrently and return the answers in the order of the questions."""
+        # limit the number of agent loops running at once, to stay within the rate limits of the deployment
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def answer(question: str) -> str:
+            async with semaphore:
+                try:
+                    return await self.answer_question_async(question)
+                except Exception as e:  # noqa: BLE001
+                    # a single failing question shouldn't discard the answers of all other questions
+                    return f"Error answering question: {e!s}"
+
+        return await asyncio.gather(*[answer(question) for question in questions])
+
+    async def answer_question_async(self, question: str) -> str:
+        """Answer a question using the LLM and the available tools."""
+        if not self.cache_enabled:
+            return await self.run_agent_loop(question)
+
+        # the cache (and its file) is only loaded once it is used
+        if self.semantic_cache is None:
+            self.semantic_cache = SemanticCache(
+                llm=self.llm,
+                embedding_model=CONFIG.EMBEDDING_MODEL_NAME,
+                threshold=CONFIG.SEMANTIC_CACHE_THRESHOLD,
+                path=CONFIG.SEMANTIC_CACHE_PATH,
+            )
+
+        # reuse the answer of a semantically equivalent question, this skips the whole agent loop
+        embedding = await self.semantic_cache.embed(question)
+        answer = self.semantic_cache.lookup(embedding)
+        if answer is None:
+            answer = await self.run_agent_loop(question)
+            if not answer.startswith("Error:"):
+                self.semantic_cache.add(question, embedding, answer)
+        return answer
+
+    async def run_agent_loop(self, question: str) -> str:
+        """Run the agent loop with the LLM and the available tools until the question is answered."""
         # Init question answering
         messages = [
             {"role": "system", "content": SYSTEM_PROMPT},
@@ -42,64 +196,94 @@ class Agent:
         # agent loop
         while not task_finished:
             # Call the LLM with the current messages
-            response = self.llm_call(messages)
+            response = await self.llm_call(messages)
             # if finish_reason is "stop", we are done
             if response.finish_reason == "stop":
+                if response.message.refusal is not None:
+                    return f"Error: The model refused to answer: {response.message.refusal}"
                 messages.append({"role": "assistant", "content": response.message.content})
                 task_finished = True
             elif response.message.tool_calls is not None:
-                messages = self.call_tool_and_append_result(llm_response=response, messages=messages)
+                messages = await self.call_tool_and_append_result(llm_response=response, messages=messages)
+                messages = self.truncate_old_tool_results(messages)
             else:
                 return f"Error: Unknown stop reason: {response.finish_reason}"
 
-        # final formatting
-        return self.format_response(f"Question:{question} \n\n\n Agent Answer:{messages[-1]["content"]}")
+        # the final answer is already formatted according to the system prompt
+        return _json_loads(messages[-1]["content"])["answer"]
 
-    def call_tool_and_append_result(self, llm_response: Choice, messages: list) -> list:
-        """Call the requested tool and return the result as a string."""
+    async def call_tool_and_append_result(self, llm_response: Choice, messages: list) -> list:
+        """Call the requested tools concurrently and append the results in the order of the tool calls."""
         messages.append(llm_response.message)
-        for tool_call in llm_response.message.tool_calls:
-            # args are returned as a string, so we need to parse them to a dict
-            arguments = (
-                json.loads(tool_call.function.arguments)
-                if isinstance(tool_call.function.arguments, str)
-                else tool_call.function.arguments
-            )
-            # call the tool and append the result
-            tool_result = self.tools[tool_call.function.name][0](**arguments)
+        tool_calls = llm_response.message.tool_calls
+        # run all tool calls at once in worker threads, so the latency is the slowest call instead of the sum
+        tool_results = await asyncio.gather(
+            *[self.run_tool_call(tool_call) for tool_call in tool_calls],
+            return_exceptions=True,
+        )
+
+        # append the results in the original order, matching the tool_call_ids
+        for tool_call, tool_result in zip(tool_calls, tool_results, strict=True):
+            if isinstance(tool_result, Exception):
+                # pass the failure to the LLM, so it can pick another tool instead of retrying blindly
+                logger.error("Tool %s failed", tool_call.function.name, exc_info=tool_result)
+                content = _json_dumps(f"Error: {tool_result!s}")
+            else:
+                content = _json_dumps(tool_result)
             messages.append(
                 {
                     "role": "tool",
                     "tool_call_id": tool_call.id,
                     "name": tool_call.function.name,
-                    "content": str(json.dumps(tool_result)),
+                    "content": content,
                 },
             )
         return messages
 
-    def llm_call(self, messages: list, use_reasoning: bool = True) -> Choice:
+    async def run_tool_call(self, tool_call: ChatCompletionMessageToolCall) -> Any:  # noqa: ANN401
+        """Run the tool requested by the LLM in a worker thread and return its result."""
+        if tool_call.function.name not in self.tools:
+            msg = f"Unknown tool: {tool_call.function.name}"
+            raise ValueError(msg)
+        # args are returned as a string, so we need to parse them to a dict
+        arguments = (
+            _json_loads(tool_call.function.arguments)
+            if isinstance(tool_call.function.arguments, str)
+            else tool_call.function.arguments
+        )
+        return await asyncio.to_thread(self.tools[tool_call.function.name][0], **arguments)
+
+    def truncate_old_tool_results(self, messages: list) -> list:
+        """Shorten the tool results of earlier turns once the history gets too long.
+
+        The whole history is sent again on every turn, so without a bound the prompt grows with every tool result.
+        The results of the latest turn are kept, as the LLM didn't see them yet.
+        """
+        history_size = sum(_content_length(message) for message in messages)
+        if history_size <= CONFIG.AGENT_MAX_HISTORY_CHARS:
+            return messages
+
+        # the last message which isn't a dict is the assistant message with the tool calls of the latest turn
+        latest_turn = max(index for index, message in enumerate(messages) if not isinstance(message, dict))
+        for message in messages[:latest_turn]:
+            if (
+                isinstance(message, dict)
+                and message["role"] == "tool"
+                and len(message["content"]) > TRUNCATED_TOOL_RESULT_CHARS + len(TRUNCATED_MARKER)
+            ):
+                message["content"] = message["content"][:TRUNCATED_TOOL_RESULT_CHARS] + TRUNCATED_MARKER
+        return messages
+
+    async def llm_call(self, messages: list, use_reasoning: bool = True) -> Choice:
         """Call the LLM with the given messages and return the response."""
         gpt_request_params = {
             "model": self.reasoning_model_name if use_reasoning else self.model_name,
             "messages": messages,
-            "tools": [{"type": "function", "function": tool} for tool in self.tool_definitions],
+            "tools": self.tool_definitions_payload,
+            "response_format": FINAL_ANSWER_FORMAT,
         }
         if use_reasoning:
             gpt_request_params["reasoning_effort"] = self.reasoning_effort
 
-        res = self.llm.chat.completions.create(**gpt_request_params)
+        res = await create_chat_completion(self.llm, **gpt_request_params)
         return res.choices[0]
-
-    def format_response(self, response: str) -> str:
-        """Format the response from the LLM."""
-        format_prompt = (
-            "You are an AI assistant, who is responsable for formatting the response of the LLM. "
-            "You get the answer from another Agent and you just need to format it. "
-            "Sometimes the question already has a formatting instruction, so you need to follow it. "
-            "The Answer should be a number OR as few words as possible OR a comma separated list of numbers and/or strings."  # noqa: E501
-            "If you are asked for a number, don't use comma to write your number neither use units such as $ or percent sign unless specified otherwise. "  # noqa: E501
-            "If you are asked for a string, don't use articles, neither abbreviations (e.g. for cities), and write the digits in plain text unless specified otherwise."  # noqa: E501
-            "If you are asked for a comma separated list, apply the above rules depending of whether the element to be put in the list is a number or a string."  # noqa: E501
-        )
-        messages = [{"role": "system", "content": format_prompt}, {"role": "user", "content": response}]
-        return self.llm.chat.completions.create(model=self.model_name, messages=messages).choices[0].message.content
@@ -14,6 +14,17 @@ class Config(BaseSettings, cli_enforce_required=True):
 
     AGENT_MODEL_NAME: str = "gpt-4.1-mini"
     AGENT_REASONING_MODEL_NAME: str = "o4-mini"
+    AGENT_MAX_CONCURRENCY: int = 4
+    AGENT_MAX_HISTORY_CHARS: int = 16000
+
+    LLM_CACHE_ENABLED: bool = False
+    LLM_CACHE_MAX_SIZE: int = 256
+    LLM_CACHE_TTL_SECONDS: int = 3600
+
+    SEMANTIC_CACHE_ENABLED: bool = False
+    SEMANTIC_CACHE_PATH: str | None = None
+    SEMANTIC_CACHE_THRESHOLD: float = 0.95
+    EMBEDDING_MODEL_NAME: str = "text-embedding-3-small"
 
 
 CONFIG = Config()
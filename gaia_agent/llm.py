@@ -1,12 +1,27 @@
-from openai import AzureOpenAI
+from functools import lru_cache
+
+from openai import AsyncAzureOpenAI, AzureOpenAI
 
 from .config import CONFIG
 
 
+@lru_cache(maxsize=1)
 def get_llm() -> AzureOpenAI:
-    """Return Azure OpenAI Client Instance."""
+    """Return the shared Azure OpenAI Client Instance, so its connection pool is reused."""
     return AzureOpenAI(
         api_version=CONFIG.AZURE_OPENAI_API_VERSION,
         api_key=CONFIG.AZURE_OPENAI_API_KEY,
         azure_endpoint=CONFIG.AZURE_OPENAI_API_ENDPOINT,
     )
+
+
+def get_async_llm() -> AsyncAzureOpenAI:
+    """Return a new async Azure OpenAI Client Instance.
+
+    The connection pool of the async client is bound to the event loop it is used on, so it is not shared.
+    """
+    return AsyncAzureOpenAI(
+        api_version=CONFIG.AZURE_OPENAI_API_VERSION,
+        api_key=CONFIG.AZURE_OPENAI_API_KEY,
+        azure_endpoint=CONFIG.AZURE_OPENAI_API_ENDPOINT,
+    )
@@ -0,0 +1,83 @@
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any
+
+from openai import AsyncAzureOpenAI
+from openai.types.chat import ChatCompletion
+
+from .config import CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+def _to_jsonable(obj: Any) -> Any:  # noqa: ANN401
+    """Convert objects which are not JSON serializable (e.g. pydantic models from the OpenAI SDK)."""
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(exclude_none=True)
+    return str(obj)
+
+
+def cache_key(request_params: dict) -> str:
+    """Return a deterministic key for the given chat completion request parameters."""
+    serialized = json.dumps(request_params, sort_keys=True, default=_to_jsonable)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """In-memory LRU cache with TTL for chat completion responses."""
+
+    def __init__(self, max_size: int, ttl_seconds: int):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        # responses are stored as JSON, so cached objects can't be mutated by the caller
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+    def get(self, key: str) -> ChatCompletion | None:
+        """Return the cached response for the key or None if it is missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+            self._entries.pop(key, None)
+            self.misses += 1
+            logger.debug("LLM cache miss (hits=%d, misses=%d)", self.hits, self.misses)
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        logger.debug("LLM cache hit (hits=%d, misses=%d)", self.hits, self.misses)
+        return ChatCompletion.model_validate_json(entry[1])
+
+    def set(self, key: str, completion: ChatCompletion) -> None:
+        """Store the response and evict the least recently used entries if the cache is full."""
+        self._entries[key] = (time.monotonic(), completion.model_dump_json())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+LLM_CACHE = LLMCache(max_size=CONFIG.LLM_CACHE_MAX_SIZE, ttl_seconds=CONFIG.LLM_CACHE_TTL_SECONDS)
+
+
+def _is_cacheable(request_params: dict) -> bool:
+    """Return whether the request may be served from the cache.
+
+    The cache is opt-in, as cached responses are replayed even though the API samples with temperature 1 by default
+    (e.g. a retried question gets the same answers). Requests with an explicit non-zero temperature are never cached.
+    """
+    return CONFIG.LLM_CACHE_ENABLED and request_params.get("temperature", 0) == 0
+
+
+async def create_chat_completion(llm: AsyncAzureOpenAI, **request_params) -> ChatCompletion:
+    """Create a chat completion and serve identical deterministic requests from the cache."""
+    if not _is_cacheable(request_params):
+        return await llm.chat.completions.create(**request_params)
+
+    key = cache_key(request_params)
+    completion = LLM_CACHE.get(key)
+    if completion is None:
+        completion = await llm.chat.completions.create(**request_params)
+        LLM_CACHE.set(key, completion)
+    return completion
@@ -0,0 +1,104 @@
+import json
+import logging
+from pathlib import Path
+
+import numpy as np
+from openai import AsyncAzureOpenAI
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticCache:
+    """Cache of final answers, matched by the cosine similarity of the question embeddings."""
+
+    def __init__(self, llm: AsyncAzureOpenAI, embedding_model: str, threshold: float, path: str | None = None):
+        self.llm = llm
+        self.embedding_model = embedding_model
+        self.threshold = threshold
+        # optional JSON Lines file, so the cache survives restarts (e.g. between runs of an evaluation)
+        self.path = Path(path) if path else None
+        self._questions: list[str] = []
+        self._answers: list[str] = []
+        self._embeddings = np.empty((0, 0), dtype=np.float32)
+        # set if the file ends with a partially written line, the next entry has to start on a new line
+        self._terminate_last_line = False
+        if self.path is not None and self.path.exists():
+            self._load()
+
+    async def embed(self, question: str) -> np.ndarray:
+        """Return the normalized embedding of the question."""
+        response = await self.llm.embeddings.create(model=self.embedding_model, input=question)
+        embedding = np.asarray(response.data[0].embedding, dtype=np.float32)
+        return embedding / np.linalg.norm(embedding)
+
+    def lookup(self, embedding: np.ndarray) -> str | None:
+        """Return the answer of the most similar cached question, if it is similar enough."""
+        if not self._answers:
+            return None
+        if self._embeddings.shape[1] != embedding.shape[0]:
+            # the cached entries were embedded with another embedding model
+            logger.warning("Semantic cache entries have a different embedding dimension, ignoring them")
+            return None
+        # embeddings are normalized, so the dot product is the cosine similarity
+        similarities = self._embeddings @ embedding
+        best_match = int(np.argmax(similarities))
+        if similarities[best_match] < self.threshold:
+            return None
+        logger.debug("Semantic cache hit (similarity=%.3f): %s", similarities[best_match], self._questions[best_match])
+        return self._answers[best_match]
+
+    def add(self, question: str, embedding: np.ndarray, answer: str) -> None:
+        """Add the answer of a question to the cache."""
+        if self._answers and self._embeddings.shape[1] != embedding.shape[0]:
+            # entries of another embedding model can't be compared with new ones, so only the new entries are kept
+            self._questions, self._answers = [], []
+            self._embeddings = np.empty((0, 0), dtype=np.float32)
+        self._append(question, embedding, answer)
+        if self.path is not None:
+            # only append the new entry, a crash can at most truncate this line
+            entry = {"question": question, "embedding": embedding.tolist(), "answer": answer}
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(("\n" if self._terminate_last_line else "") + json.dumps(entry) + "\n")
+            self._terminate_last_line = False
+
+    def _load(self) -> None:
+        try:
+            content = self.path.read_text(encoding="utf-8")
+        except (OSError, UnicodeDecodeError):
+            logger.exception("Could not read semantic cache file %s, starting with an empty cache", self.path)
+            return
+        self._terminate_last_line = bool(content) and not content.endswith("\n")
+        entries = []
+        for line_number, line in enumerate(content.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                entries.append(
+                    (entry["question"], np.asarray(entry["embedding"], dtype=np.float32).ravel(), entry["answer"]),
+                )
+            except (ValueError, KeyError, TypeError):
+                logger.warning("Skipping unreadable entry in semantic cache file %s (line %d)", self.path, line_number)
+        if not entries:
+            return
+
+        # the file may contain entries of a previous embedding model, only the ones matching the latest entry are used
+        dimension = entries[-1][1].shape[0]
+        skipped = 0
+        for question, embedding, answer in entries:
+            if embedding.shape[0] == dimension:
+                self._append(question, embedding, answer)
+            else:
+                skipped += 1
+        if skipped:
+            logger.warning(
+                "Skipping %d entries with a different embedding dimension in semantic cache file %s",
+                skipped,
+                self.path,
+            )
+
+    def _append(self, question: str, embedding: np.ndarray, answer: str) -> None:
+        self._questions.append(question)
+        self._answers.append(answer)
+        embedding = embedding[np.newaxis, :]
+        self._embeddings = embedding if self._embeddings.size == 0 else np.vstack([self._embeddings, embedding])
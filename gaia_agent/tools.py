@@ -1,17 +1,77 @@
+import logging
 import os
+import re
+import shutil
 import tempfile
+import uuid
+from functools import lru_cache
+from http import HTTPStatus
 from typing import Callable
-from urllib.parse import parse_qs, quote_plus, urlparse
+from urllib.parse import quote_plus, urlparse
 
 import pandas as pd
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer, Tag
+from cachetools.func import ttl_cache
 from openai.types import FunctionDefinition
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from youtube_transcript_api import NoTranscriptFound, TranscriptsDisabled, YouTubeTranscriptApi
 
 from .config import CONFIG
 from .llm import get_llm
 
+logger = logging.getLogger(__name__)
+
+# shared session for all tools, so connections (TCP + TLS) to the same hosts are kept alive and reused
+HTTP_SESSION = requests.Session()
+_http_adapter = HTTPAdapter(
+        pool_connections=20,
+        pool_maxsize=50,
+        max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504]),
+        )
+HTTP_SESSION.mount("https://", _http_adapter)
+HTTP_SESSION.mount("http://", _http_adapter)
+# HTTP_SESSION.headers["User-Agent"] = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"  # noqa: E501
+
+
+@ttl_cache(maxsize=128, ttl=1800)
+def _get_cached_page(url: str) -> bytes:
+    """Return the content of a page which rarely changes (search results, Wikipedia), cached for 30 minutes.
+
+    Failed requests raise and are therefore not cached.
+    """
+    response = HTTP_SESSION.get(url, timeout=60)
+    response.raise_for_status()
+    # other 2xx responses aren't the page itself (e.g. DuckDuckGo answers rate limited clients with a 202 challenge)
+    if response.status_code != HTTPStatus.OK:
+        msg = f"Unexpected status code {response.status_code} for url: {url}"
+        raise requests.HTTPError(msg, response=response)
+    return response.content
+
+
+def _class_strainer(tag_name: str, css_class: str) -> SoupStrainer:
+    """Return a SoupStrainer which only builds the elements with the given CSS class (and their children)."""
+    # while parsing, the class attribute is still the raw string, so multi-valued classes have to be split manually
+    return SoupStrainer(tag_name, class_=lambda classes: classes is not None and css_class in classes.split())
+
+
+# only build the parts of the DOM the tools actually read
+SEARCH_RESULTS_STRAINER = _class_strainer("div", "result")
+WIKIPEDIA_CONTENT_STRAINER = _class_strainer("div", "mw-parser-output")
+
+
+def _get_text_prefix(element: Tag, max_chars: int = 2000) -> str:
+    """Return the first characters of the visible text, without building the text of the whole element."""
+    parts = []
+    total = 0
+    for text in element.stripped_strings:
+        parts.append(text)
+        total += len(text) + 1
+        if total > max_chars:
+            break
+    return " ".join(parts)[:max_chars]
+
 
 def download_file_from_url(url: str, filename: str | None = None) -> str:
     """Download a file from a URL and save it to a temporary location."""
@@ -22,22 +82,18 @@ def download_file_from_url(url: str, filename: str | None = None) -> str:
             filename = os.path.basename(path)
             if not filename:
                 # Generate a random name if we couldn't extract one
-                import uuid
-
                 filename = f"downloaded_{uuid.uuid4().hex[:8]}"
 
         # Create temporary file
         temp_dir = tempfile.gettempdir()
         filepath = os.path.join(temp_dir, filename)
 
-        # Download the file
-        response = requests.get(url, stream=True, timeout=30)
-        response.raise_for_status()
-
-        # Save the file
-        with open(filepath, "wb") as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
+        # Download the file and stream it straight to disk, the copy loop runs in C with 1 MiB chunks
+        with HTTP_SESSION.get(url, stream=True, timeout=30) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            with open(filepath, "wb") as f:
+                shutil.copyfileobj(response.raw, f, length=1024 * 1024)
     except Exception as e:  # noqa: BLE001
         return f"Error downloading file: {e!s}"
     else:
@@ -47,62 +103,62 @@ def download_file_from_url(url: str, filename: str | None = None) -> str:
 def read_content_from_webpage(url: str) -> str:
     """Read content from a webpage and return it as text."""
     try:
-        response = requests.get(url, timeout=60)
+        response = HTTP_SESSION.get(url, timeout=60)
         response.raise_for_status()
-        soup = BeautifulSoup(response.text, "html.parser")
-        content = soup.get_text()
-        return content[:2000]  # Limit to first 2000 characters
+        soup = BeautifulSoup(response.content, "lxml")
+        return _get_text_prefix(soup, max_chars=2000)  # Limit to first 2000 characters
     except requests.RequestException as e:
-        print(f"Error reading webpage: {e}")
-        return ""
+        logger.exception("Error reading webpage %s", url)
+        return f"Error reading webpage: {e!s}"
 
 
-def analyze_excel_file(file_path: str) -> str:
-    """Analyze the Excel file and return a summary."""
-    df = pd.read_excel(file_path, engine="openpyxl")
-    result = f"Excel file loaded with {len(df)} rows and {len(df.columns)} columns.\n"
-    result += f"Columns: {', '.join(df.columns)}\n\n"
+def _summarize_dataframe(df: pd.DataFrame, file_type: str) -> str:
+    """Return a summary of the loaded table for the LLM."""
+    result = f"{file_type} file loaded with {len(df)} rows and {len(df.columns)} columns.\n"
+    result += f"Columns: {', '.join(map(str, df.columns))}\n\n"
 
-    # Add summary statistics
+    # Add summary statistics (pandas only describes the numeric columns, if there are any)
     result += "Summary statistics:\n"
     result += str(df.describe())
 
     return result
 
 
+def analyze_excel_file(file_path: str) -> str:
+    """Analyze the Excel file and return a summary."""
+    # calamine is a Rust based reader and much faster than openpyxl
+    df = pd.read_excel(file_path, engine="calamine")
+    return _summarize_dataframe(df, "Excel")
+
+
 def analyze_csv_file(file_path: str) -> str:
     """Analyze the CSV file and return a summary."""
-    df = pd.read_excel(file_path)
-    result = f"CSV file loaded with {len(df)} rows and {len(df.columns)} columns.\n"
-    result += f"Columns: {', '.join(df.columns)}\n\n"
+    # the pyarrow engine parses multithreaded in C++
+    df = pd.read_csv(file_path, engine="pyarrow")
+    return _summarize_dataframe(df, "CSV")
 
-    # Add summary statistics
-    result += "Summary statistics:\n"
-    result += str(df.describe())
 
-    return result
+IMAGE_ANALYSIS_PROMPT = (
+        "Analyze the image and provide a detailed description of its content.\n"
+        "The important pieces of information to extract from the image are:\n"
+        "1. Visual elements and objects\n"
+        "2. Colors, Patterns, Composition and Style\n"
+        "3. Text, Numbers and Symbols if present\n"
+        "4. Contextual information\n"
+        "5. Overall context and meaning\n"
+        "6. Any other relevant details\n"
+)
 
 
 def analyze_image_from_url(image_url: str) -> str:
     """Analyze an image provided through an URL and return a detailed textual description of its content."""
-    # Placeholder for image analysis logic
-    prompt = (
-            "Analyze the image and provide a detailed description of its content.\n"
-            "The important pieces of information to extract from the image are:\n"
-            "1. Visual elements and objects\n"
-            "2. Colors, Patterns, Composition and Style\n"
-            "3. Text, Numbers and Symbols if present\n"
-            "4. Contextual information\n"
-            "5. Overall context and meaning\n"
-            "6. Any other relevant details\n"
-    )
     llm = get_llm()
 
     messages = [
             {
                     "role": "user",
                     "content": [
-                            {"type": "text", "text": prompt},
+                            {"type": "text", "text": IMAGE_ANALYSIS_PROMPT},
                             {"type": "image_url", "image_url": {"url": image_url}},
                             ],
                     }
@@ -117,19 +173,14 @@ def analyze_image_from_base64(base64_image: str) -> str:
     return analyze_image_from_url(f"data:image/jpeg;base64,{base64_image}")
 
 
-def search_web(search_term: str, num_results: int = 5) -> list[dict[str, str]]:
+def search_web(search_term: str, num_results: int = 5) -> list[dict[str, str]] | str:
     """Websearch using DuckDuckGo."""
     encoded_search_term = quote_plus(search_term)
-    headers = {
-            # "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",  # noqa: E501
-            }
-
     search_url = f"https://html.duckduckgo.com/html/?q={encoded_search_term}"
 
     try:
-        response = requests.get(search_url, headers=headers, timeout=60)
-        response.raise_for_status()  # Fehler bei HTTP-Statuscode != 200 auslösen
-        soup = BeautifulSoup(response.text, "html.parser")
+        content = _get_cached_page(search_url)
+        soup = BeautifulSoup(content, "lxml", parse_only=SEARCH_RESULTS_STRAINER)
 
         results = []
         result_elements = soup.select(".result")
@@ -149,17 +200,15 @@ def search_web(search_term: str, num_results: int = 5) -> list[dict[str, str]]:
         return results  # noqa: TRY300
 
     except requests.RequestException as e:
-        print(f"Fehler bei der Websuche: {e}")
-        return []
+        logger.exception("Error searching the web for %r", search_term)
+        return f"Error searching the web: {e!s}"
 
 
-def check_available_wikipedia_articles(possible_title: str) -> list[str]:
+def check_available_wikipedia_articles(possible_title: str) -> list[str] | str:
     """Check if a Wikipedia article with the given title exists."""
     try:
         search_url = f"https://en.wikipedia.org/w/index.php?search={possible_title.replace(' ', '_')}"
-        response = requests.get(search_url, timeout=60)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, "html.parser")
+        soup = BeautifulSoup(_get_cached_page(search_url), "lxml")
 
         # check if redirected to page
         if "Suchergebnisse" not in soup.title.string:
@@ -195,58 +244,55 @@ def check_available_wikipedia_articles(possible_title: str) -> list[str]:
         return search_results  # noqa: TRY300
 
     except requests.RequestException as e:
-        print(f"Fehler bei der Wikipedia-Suche: {e}")
-        return []
+        logger.exception("Error searching Wikipedia for %r", possible_title)
+        return f"Error searching Wikipedia: {e!s}"
 
 
 def get_wikipedia_article(title: str) -> str:
     """Return the content of a Wikipedia article."""
     try:
         url = f"https://en.wikipedia.org/wiki/{title.replace(' ', '_')}"
-        response = requests.get(url, timeout=60)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, "html.parser")
-        return soup.find("div", class_="mw-parser-output").get_text()
+        soup = BeautifulSoup(_get_cached_page(url), "lxml", parse_only=WIKIPEDIA_CONTENT_STRAINER)
+        return _get_text_prefix(soup.find("div", class_="mw-parser-output"), max_chars=2000)
     except requests.RequestException as e:
-        print(f"Fehler beim Abrufen des Wikipedia-Artikels: {e}")
-        return ""
+        logger.exception("Error retrieving Wikipedia article %r", title)
+        return f"Error retrieving Wikipedia article: {e!s}"
 
 
-def download_youtube_transcript(video_url: str) -> str:
-    """Download the transcript of a YouTube video."""
+YOUTUBE_TRANSCRIPT_API = YouTubeTranscriptApi()
+YOUTUBE_VIDEO_ID_PATTERN = re.compile(
+        r"^(?:https?://)?(?:(?:www\.|m\.)?youtube\.com/(?:watch\?(?:[^#]*&)?v=|embed/|v/)|youtu\.be/)([A-Za-z0-9_-]{11})",
+        )
+
+
+@lru_cache(maxsize=256)
+def _fetch_youtube_transcript(video_id: str) -> str | None:
+    """Return the transcript text of a YouTube video, preferring German or English."""
+    transcript_list = YOUTUBE_TRANSCRIPT_API.list(video_id)
     try:
-        # Extract video ID from URL
-        parsed_url = urlparse(video_url)
-        if parsed_url.hostname == "youtu.be":
-            video_id = parsed_url.path[1:]
-        elif parsed_url.hostname in ("www.youtube.com", "youtube.com"):
-            if parsed_url.path == "/watch":
-                query_params = parse_qs(parsed_url.query)
-                video_id = query_params.get("v", [None])[0]
-            elif parsed_url.path.startswith("/embed/") or parsed_url.path.startswith("/v/"):
-                video_id = parsed_url.path.split("/")[2]
-            else:
-                return "Error: Could not extract video ID from URL."
-        else:
-            return "Error: Invalid YouTube URL."
-
-        if not video_id:
-            return "Error: Could not extract video ID from URL."
+        transcript = transcript_list.find_transcript(["de", "en"])
+    except NoTranscriptFound:
+        # If not found, fetch any available transcript
+        transcript = next(iter(transcript_list), None)
+        if transcript is None:
+            return None
 
-        # Get transcript
-        transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
+    return " ".join([item.text for item in transcript.fetch()])
 
-        # Try fetching German or English transcript first
-        try:
-            transcript = transcript_list.find_generated_transcript(["de", "en"])
-        except NoTranscriptFound:
-            # If not found, fetch any available transcript
-            transcript = transcript_list.find_generated_transcript(transcript_list._generated_transcripts.keys())  # noqa: SLF001
 
-        transcript_data = transcript.fetch()
+def download_youtube_transcript(video_url: str) -> str:
+    """Download the transcript of a YouTube video."""
+    try:
+        # Extract video ID from URL (youtu.be, /watch?v=, /embed/ and /v/ URLs)
+        match = YOUTUBE_VIDEO_ID_PATTERN.search(video_url)
+        if not match:
+            if urlparse(video_url).hostname not in ("youtu.be", "www.youtube.com", "youtube.com", "m.youtube.com"):
+                return "Error: Invalid YouTube URL."
+            return "Error: Could not extract video ID from URL."
 
-        # Format transcript
-        full_transcript = " ".join([item.text for item in transcript_data])
+        full_transcript = _fetch_youtube_transcript(match.group(1))
+        if full_transcript is None:
+            return "Error: No transcript found for this video or transcripts are disabled."
         return full_transcript[:4000]  # Limit length if necessary
 
     except (NoTranscriptFound, TranscriptsDisabled):
@@ -265,8 +311,12 @@ def transcribe_mp3_file(file_path: str) -> str:
     return transcription.text
 
 
+@lru_cache(maxsize=1)
 def get_tool_list() -> dict[str, tuple[Callable, FunctionDefinition]]:
-    """Return a dictionary of available tools, keyed by their string name."""
+    """Return a dictionary of available tools, keyed by their string name.
+
+    The dictionary is built once and shared, so it must not be modified by the caller.
+    """
     # Define the original mapping of callable -> FunctionDefinition
     tools_mapping = {
             transcribe_mp3_file: FunctionDefinition(
@@ -423,3 +473,15 @@ def get_tool_list() -> dict[str, tuple[Callable, FunctionDefinition]]:
             func_def.name: (callable_obj, func_def)
             for callable_obj, func_def in tools_mapping.items()
             }
+
+
+@lru_cache(maxsize=1)
+def get_tools_payload() -> list[dict]:
+    """Return the JSON serialized tool definitions for the chat completions API.
+
+    The payload is serialized once and shared, so it must not be modified by the caller.
+    """
+    return [
+            {"type": "function", "function": func_def.model_dump(mode="json", exclude_none=True)}
+            for _, func_def in get_tool_list().values()
+            ]